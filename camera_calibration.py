@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Kalibracja kamery na ChArUco z pliku WIDEO – przetwarza **wszystkie klatki**.
+Kalibracja kamery na ChArUco z pliku WIDEO – przetwarza co FRAME_STRIDE-tą klatkę.
 Wzorzec zgodny z naszym wydrukiem:
 - squares: 4x6
 - square=40 mm, marker=32 mm (80%)
@@ -16,7 +16,10 @@ from __future__ import annotations
 import cv2
 import numpy as np
 from pathlib import Path
-import time, json, sys
+import time, json, sys, os, queue, threading
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # ====== KONFIGURACJA ======
 # >>> ŚCIEŻKA DO WIDEO (USTAWIONA NA STAŁE) <<<
@@ -31,9 +34,14 @@ DICT_NAME = "DICT_6X6_1000"
 
 # Minimalna liczba rogów ChArUco w klatce, aby ją użyć
 MIN_CHARUCO = 4  # Zmniejszone z 8 na 4
+# Poniżej tej liczby markerów nie da się zinterpolować MIN_CHARUCO rogów – klatka od razu odpada
+MIN_MARKERS = max(2, MIN_CHARUCO // 2)
 
-# Debug - pokazuj postęp
+# Debug - pokazuj postęp (jedna linia co PROGRESS_EVERY przetworzonych klatek)
 DEBUG = True
+PROGRESS_EVERY = 100
+# Szczegóły detekcji dla co 30. klatki (ID markerów, liczba rogów)
+VERBOSE = False
 
 # Flagi kalibracji (rozszerzony model dystorsji)
 CALIB_FLAGS = cv2.CALIB_RATIONAL_MODEL
@@ -41,18 +49,62 @@ CALIB_FLAGS = cv2.CALIB_RATIONAL_MODEL
 # Opcjonalne skalowanie wejścia (None = bez zmian)
 RESIZE_WIDTH = None
 
+# Co którą klatkę dekodować (1 = każdą). Pozostałe są tylko przewijane przez grab(),
+# bez kosztownej konwersji YUV→BGR – do kalibracji wystarczy kilkadziesiąt zróżnicowanych ujęć.
+FRAME_STRIDE = 5
+
+# Skala obrazu do detekcji markerów (1.0 = pełna rozdzielczość). Progowanie i kontury
+# liczone są na pomniejszonym obrazie, a rogi doprecyzowywane cornerSubPix na pełnym.
+DETECT_SCALE = 0.5
+
+# Skalowanie/konwersja koloru przez OpenCL (cv2.UMat), gdy OpenCV ma dostępne urządzenie.
+# Domyślnie wyłączone: każda klatka jest wysyłana na GPU i pobierana z powrotem do detekcji,
+# z pominięciem wielokrotnie używanych buforów – opłaca się tylko po zmierzeniu na danym sprzęcie.
+USE_OPENCL = False
+
+# Ile zdekodowanych klatek może czekać w kolejce między wątkiem dekodera a detekcją
+DECODE_QUEUE = 8
+
+# Ile klatek naraz może czekać na detekcję w puli wątków (pamięć: DETECT_BATCH × rozmiar klatki)
+DETECT_BATCH = 16
+
+# Wątki OpenCV na czas detekcji: równoległość daje pula (wątek na rdzeń), więc wewnętrzne
+# wątki resize/detectMarkers/cornerSubPix tylko by ją przeciążały (N×N). None = bez zmian.
+CV_THREADS = 1
+
+# Selekcja ujęć przed kalibracją: siatka pokrycia kadru COVERAGE_GRID×COVERAGE_GRID.
+# Ujęcie zostaje, jeśli pokrywa >= MIN_NEW_CELLS nowych komórek (pierwsze MIN_RETAINED zawsze).
+COVERAGE_GRID = 16
+MIN_NEW_CELLS = 2
+MIN_RETAINED = 20
+
+# Wczesne zakończenie: po EARLY_EXIT_MIN_FRAMES użytych klatkach przerwij, gdy ostatnie
+# EARLY_EXIT_WINDOW klatek dokłada średnio mniej niż EARLY_EXIT_MIN_GAIN nowych komórek pokrycia.
+EARLY_EXIT_MIN_FRAMES = 30
+EARLY_EXIT_WINDOW = 20
+EARLY_EXIT_MIN_GAIN = 0.2
+
 # ====== Pomocnicze: kompatybilność API OpenCV ======
+# Moduł aruco i dostępność funkcji rozstrzygane raz przy imporcie, nie w pętli po klatkach
+_ARUCO = getattr(cv2, "aruco", None)
+_HAS_INTERP = _ARUCO is not None and hasattr(_ARUCO, "interpolateCornersCharuco")
+
+
 def _aruco_pkg():
-    if not hasattr(cv2, "aruco"):
+    if _ARUCO is None:
         sys.exit("Brak modułu cv2.aruco (zainstaluj opencv-contrib-python).")
-    return cv2.aruco
+    return _ARUCO
 
 
+# Słownik, plansza i detektory zależą tylko od stałych modułu – tworzone raz na proces
+# (lru_cache), więc kolejne wywołania calibrate_from_video używają tych samych obiektów.
+@lru_cache(maxsize=1)
 def make_dictionary():
     aruco = _aruco_pkg()
     return aruco.getPredefinedDictionary(getattr(aruco, DICT_NAME))
 
 
+@lru_cache(maxsize=1)
 def make_detector(dictionary):
     aruco = _aruco_pkg()
     # DetectorParameters – różne API w zależności od wersji
@@ -89,6 +141,7 @@ def make_detector(dictionary):
     return (dictionary, params), params
 
 
+@lru_cache(maxsize=1)
 def make_charuco_detector(board):
     aruco = _aruco_pkg()
     # OpenCV 4.7+ provides a dedicated CharucoDetector API
@@ -100,14 +153,16 @@ def make_charuco_detector(board):
     return None
 
 
-def detect_markers(detector, gray):
-    aruco = _aruco_pkg()
+def make_detect_markers(detector):
+    """Zwraca funkcję gray -> (corners, ids, rejected) z metodą detekcji związaną raz."""
     if isinstance(detector, tuple):
         dictionary, params = detector
-        return aruco.detectMarkers(gray, dictionary, parameters=params)
-    return detector.detectMarkers(gray)
+        detect = _aruco_pkg().detectMarkers
+        return lambda gray: detect(gray, dictionary, parameters=params)
+    return detector.detectMarkers
 
 
+@lru_cache(maxsize=1)
 def make_charuco_board():
     aruco = _aruco_pkg()
     dic = make_dictionary()
@@ -159,94 +214,332 @@ def calibrate_charuco(charuco_corners, charuco_ids, board, image_size):
     return retval, K, D, rvecs, tvecs, None, None, None
 
 
+class NumpyEncoder(json.JSONEncoder):
+    """JSON dla tablic/skalarów NumPy – konwersja dopiero przy serializacji."""
+
+    def default(self, o):
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+        return super().default(o)
+
+
+# Maska pokrycia: COVERAGE_GRID² komórek jako bity w słowach uint64 (16×16 = 4 słowa)
+_MASK_WORDS = -(-COVERAGE_GRID * COVERAGE_GRID // 64)
+# Liczba ustawionych bitów w bajcie – gdy NumPy nie ma np.bitwise_count (< 2.0)
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(mask: np.ndarray) -> int:
+    """Liczba ustawionych bitów w masce uint64."""
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(mask).sum())
+    return int(_POPCOUNT8[mask.view(np.uint8)].sum())
+
+
+def _view_mask(ch_corners, image_size) -> np.ndarray:
+    """Maska bitowa komórek siatki pokrycia, w które trafiają rogi ChArUco ujęcia."""
+    w, h = image_size
+    pts = ch_corners.reshape(-1, 2)
+    cx = np.clip((pts[:, 0] * (COVERAGE_GRID / w)).astype(np.intp), 0, COVERAGE_GRID - 1)
+    cy = np.clip((pts[:, 1] * (COVERAGE_GRID / h)).astype(np.intp), 0, COVERAGE_GRID - 1)
+    cells = cy * COVERAGE_GRID + cx
+    mask = np.zeros(_MASK_WORDS, dtype=np.uint64)
+    np.bitwise_or.at(mask, cells >> 6, np.left_shift(np.uint64(1), (cells & 63).astype(np.uint64)))
+    return mask
+
+
+def select_views(charuco_corners_all, charuco_ids_all, image_size):
+    """Zachłanny filtr prawie identycznych ujęć (np. plansza trzymana nieruchomo).
+
+    Ujęcia przeglądane są w losowej (powtarzalnej) kolejności; zostaje to, które pokrywa
+    co najmniej MIN_NEW_CELLS nowych komórek kadru. Czas rozwiązania LM rośnie liniowo
+    z liczbą ujęć, a powtórzenia nie poprawiają wyniku.
+    """
+    covered = np.zeros(_MASK_WORDS, dtype=np.uint64)
+    keep = []
+    for i in np.random.default_rng(0).permutation(len(charuco_corners_all)):
+        mask = _view_mask(charuco_corners_all[i], image_size)
+        new_cells = _popcount(mask & ~covered)
+        if new_cells >= MIN_NEW_CELLS or len(keep) < MIN_RETAINED:
+            covered |= mask
+            keep.append(i)
+    keep.sort()
+    return [charuco_corners_all[i] for i in keep], [charuco_ids_all[i] for i in keep]
+
+
+def _resized_size(w: int, h: int) -> tuple[int, int]:
+    """Rozmiar (w, h) klatki po opcjonalnym skalowaniu do RESIZE_WIDTH."""
+    if RESIZE_WIDTH and w > RESIZE_WIDTH:
+        return RESIZE_WIDTH, int(h * (RESIZE_WIDTH / w))
+    return w, h
+
+
+def _detect_size(w: int, h: int) -> tuple[int, int]:
+    """Rozmiar (w, h) obrazu do detekcji markerów przy DETECT_SCALE."""
+    return round(w * DETECT_SCALE), round(h * DETECT_SCALE)
+
+
+def _preprocess(frame, slot, downscale):
+    """RESIZE_WIDTH → GRAY (→ obraz pomniejszony do detekcji) w buforach slotu.
+
+    Zwraca (gray, small); small = None, gdy detekcja idzie w pełnej rozdzielczości.
+    """
+    h, w = frame.shape[:2]
+    rw, rh = _resized_size(w, h)
+    if (rw, rh) != (w, h):
+        frame = cv2.resize(frame, (rw, rh), dst=_buffer(slot, "resized", (rh, rw) + frame.shape[2:]))
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=_buffer(slot, "gray", (rh, rw)))
+
+    small = None
+    if downscale and DETECT_SCALE != 1.0:
+        sw, sh = _detect_size(rw, rh)
+        small = cv2.resize(gray, (sw, sh), dst=_buffer(slot, "small", (sh, sw)),
+                           interpolation=cv2.INTER_AREA)
+    return gray, small
+
+
+def _preprocess_umat(frame, downscale):
+    """Jak _preprocess, ale skalowanie i konwersja koloru na UMat (T-API/OpenCL).
+
+    Do detekcji wracają zwykłe tablice – ścieżki aruco nie gwarantują obsługi UMat.
+    """
+    h, w = frame.shape[:2]
+    rw, rh = _resized_size(w, h)
+    src = cv2.UMat(frame)
+    if (rw, rh) != (w, h):
+        src = cv2.resize(src, (rw, rh))
+    gray_u = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
+
+    small = None
+    if downscale and DETECT_SCALE != 1.0:
+        small = cv2.resize(gray_u, _detect_size(rw, rh), interpolation=cv2.INTER_AREA).get()
+    return gray_u.get(), small
+
+
+def _buffer(slot: dict, key: str, shape: tuple) -> np.ndarray:
+    """Zwraca bufor uint8 o danym kształcie ze slotu, alokując go tylko przy zmianie kształtu."""
+    buf = slot.get(key)
+    if buf is None or buf.shape != shape:
+        buf = slot[key] = np.empty(shape, np.uint8)
+    return buf
+
+
 # ====== Pipeline kalibracji z WSZYSTKICH KLATEK ======
 def calibrate_from_video(source_path: str):
     p = Path(source_path)
     if not p.exists():
         sys.exit(f"Plik wideo nie istnieje: {p}")
 
-    aruco = _aruco_pkg()
+    _aruco_pkg()
     dictionary = make_dictionary()
     board = make_charuco_board()
     detector, _ = make_detector(dictionary)
+    detect_markers = make_detect_markers(detector)
     charuco_detector = make_charuco_detector(board)
 
     cap = cv2.VideoCapture(str(p))
     if not cap.isOpened():
         sys.exit(f"Nie można otworzyć wideo: {p}")
 
+    # Klatki zawsze w BGR i jeden cvtColor do szarości na próbkowaną klatkę. Surowa płaszczyzna Y
+    # (CAP_PROP_CONVERT_RGB=0) działała tylko dzięki awaryjnemu "8UC1" w FFmpeg – z ostrzeżeniem
+    # na stderr przy każdym retrieve() i bez gwarancji w innych backendach; zysk był niewielki.
+
     charuco_corners_all, charuco_ids_all = [], []
     image_size = None
 
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
     used_frames = 0
     processed_frames = 0
+    frame_idx = 0
+    # Oczekiwana liczba klatek do przetworzenia (po FRAME_STRIDE) – mianownik w linii postępu
+    expected_frames = -(-total_frames // FRAME_STRIDE) if total_frames > 0 else "?"
     print(f"Źródło: {p}")
-    print(f"Klatek w pliku: {total_frames if total_frames>0 else '?'} (przetwarzam wszystkie)")
+    print(f"Klatek w pliku: {total_frames if total_frames>0 else '?'} (przetwarzam co {FRAME_STRIDE}.)")
     print(f"Szukam minimum {MIN_CHARUCO} rogów ChArUco na klatkę")
 
-    while True:
-        ok, frame = cap.read()
-        if not ok:
-            break
-        if RESIZE_WIDTH and frame.shape[1] > RESIZE_WIDTH:
-            scale = RESIZE_WIDTH / frame.shape[1]
-            frame = cv2.resize(frame, (RESIZE_WIDTH, int(frame.shape[0]*scale)))
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-        processed_frames += 1
-        if DEBUG and processed_frames % 30 == 0:  # co 30 klatek
-            print(f"Przetworzono {processed_frames} klatek, użyto {used_frames}")
+    # Przebiegi pikselowe (resize, cvtColor) na GPU przez OpenCL, jeśli dostępny
+    use_umat = USE_OPENCL and cv2.ocl.haveOpenCL()
+    if use_umat:
+        cv2.ocl.setUseOpenCL(True)
+        print("OpenCL: włączony (cv2.UMat)")
+
+    use_interp = _HAS_INTERP
+    interpolate = _ARUCO.interpolateCornersCharuco if use_interp else None
+    if not use_interp and charuco_detector is None:
+        sys.exit("Twoja wersja OpenCV nie ma ani interpolateCornersCharuco ani CharucoDetector. Zaktualizuj opencv-contrib-python.")
+
+    def process_frame(frame, slot):
+        """Detekcja na jednej klatce (wątek roboczy). Zwraca (rozmiar, id markerów, rogi, id rogów).
+
+        `slot` to słownik buforów roboczych tej klatki – wyniki pośrednie trafiają do
+        prealokowanych tablic zamiast do nowych alokacji co klatkę.
+        """
+        if use_umat:
+            gray, small = _preprocess_umat(frame, use_interp)
+        else:
+            gray, small = _preprocess(frame, slot, use_interp)
+        size = (gray.shape[1], gray.shape[0])
 
-        if hasattr(aruco, "interpolateCornersCharuco"):
+        if use_interp:
             # Klasyczna ścieżka: detectMarkers -> subpix -> interpolateCornersCharuco
-            corners, ids, _ = detect_markers(detector, gray)
-            if ids is None or len(ids) == 0:
-                if DEBUG and processed_frames % 30 == 0:
-                    print(f"  Klatka {processed_frames}: brak markerów ARUCO")
-                continue
-            
-            if DEBUG and processed_frames % 30 == 0:
-                print(f"  Klatka {processed_frames}: znaleziono {len(ids)} markerów ARUCO")
-                if len(ids) > 0:
-                    print(f"    ID markerów: {ids.flatten()[:5]}...")  # Pierwsze 5 ID
+            corners, ids, _ = detect_markers(gray if small is None else small)
+            if ids is None or len(ids) < MIN_MARKERS:
+                # bez cornerSubPix i interpolateCornersCharuco – i tak nie da MIN_CHARUCO rogów
+                return size, ids, None, None
+            # cornerSubPix przyjmuje jedną tablicę punktów – łączymy rogi wszystkich markerów,
+            # przeskalowujemy do pełnej rozdzielczości i rozdzielamy z powrotem po doprecyzowaniu.
+            # Okno 5×5 px: szersze sięga do sąsiednich pól szachownicy i przesuwa rogi markerów.
+            pts = np.concatenate(corners).reshape(-1, 1, 2) / DETECT_SCALE
             try:
                 cv2.cornerSubPix(
-                    gray, corners, (5, 5), (-1, -1),
+                    gray, pts, (2, 2), (-1, -1),
                     (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 1e-4)
                 )
             except cv2.error:
                 pass
-            _, ch_corners, ch_ids = aruco.interpolateCornersCharuco(corners, ids, gray, board)
-        else:
-            # Fallback dla wersji bez interpolateCornersCharuco: użyj CharucoDetector
-            if charuco_detector is None:
-                sys.exit("Twoja wersja OpenCV nie ma ani interpolateCornersCharuco ani CharucoDetector. Zaktualizuj opencv-contrib-python.")
-            ch_corners, ch_ids, _, _ = charuco_detector.detectBoard(gray)
+            corners = tuple(pts.reshape(-1, 1, 4, 2))
+            _, ch_corners, ch_ids = interpolate(corners, ids, gray, board)
+            return size, ids, ch_corners, ch_ids
+        # Fallback dla wersji bez interpolateCornersCharuco: użyj CharucoDetector
+        ch_corners, ch_ids, _, ids = charuco_detector.detectBoard(gray)
+        return size, ids, ch_corners, ch_ids
+
+    def collect(result):
+        """Zbiera wynik jednej klatki – wywoływane w kolejności klatek."""
+        nonlocal processed_frames, used_frames, image_size, saturated
+        size, ids, ch_corners, ch_ids = result
+
+        processed_frames += 1
+        if DEBUG and processed_frames % PROGRESS_EVERY == 0:
+            print(f"Przetworzono {processed_frames}/{expected_frames} klatek, użyto {used_frames}")
+        verbose = VERBOSE and processed_frames % 30 == 0  # szczegóły co 30 klatek
+
+        if ids is None or len(ids) == 0:
+            if verbose:
+                print(f"  Klatka {processed_frames}: brak markerów ARUCO")
+            return
+        if verbose:
+            print(f"  Klatka {processed_frames}: znaleziono {len(ids)} markerów ARUCO")
+            print(f"    ID markerów: {ids.flatten()[:5]}...")  # Pierwsze 5 ID
 
         if ch_corners is None or ch_ids is None or len(ch_corners) < MIN_CHARUCO:
-            if DEBUG and processed_frames % 30 == 0:
+            if verbose:
                 corners_found = len(ch_corners) if ch_corners is not None else 0
                 print(f"  Klatka {processed_frames}: znaleziono {corners_found} rogów ChArUco (minimum: {MIN_CHARUCO})")
-            continue
+            return
 
         charuco_corners_all.append(ch_corners)
         charuco_ids_all.append(ch_ids)
         used_frames += 1
 
-        if DEBUG and processed_frames % 30 == 0:
+        if verbose:
             print(f"  Klatka {processed_frames}: ✓ użyto ({len(ch_corners)} rogów)")
 
         if image_size is None:
-            image_size = (gray.shape[1], gray.shape[0])
-
-    cap.release()
+            image_size = size
+
+        # Przyrost pokrycia kadru – gdy przestaje rosnąć, dalsze klatki nic nie wnoszą
+        mask = _view_mask(ch_corners, size)
+        recent_gain.append(_popcount(mask & ~coverage))
+        np.bitwise_or(coverage, mask, out=coverage)
+        if (used_frames >= EARLY_EXIT_MIN_FRAMES and len(recent_gain) == EARLY_EXIT_WINDOW
+                and np.mean(recent_gain) < EARLY_EXIT_MIN_GAIN):
+            saturated = True
+
+    def decode():
+        """Wątek dekodera: grab()/retrieve() do wolnych slotów i przekazanie klatek do kolejki."""
+        nonlocal frame_idx
+        try:
+            while not stop.is_set():
+                # grab() tylko demultipleksuje/dekoduje; retrieve() (konwersja do BGR) tylko co FRAME_STRIDE
+                if not cap.grab():
+                    break
+                frame_idx += 1
+                if (frame_idx - 1) % FRAME_STRIDE != 0:
+                    continue
+                slot = free_slots.get()
+                ok, frame = cap.retrieve(slot.get("frame"))
+                if not ok:
+                    break
+                slot["frame"] = frame
+                frame_q.put((frame, slot))
+        except Exception as e:
+            decode_errors.append(e)
+        finally:
+            frame_q.put(None)
+
+    def collect_next():
+        future, slot = inflight.popleft()
+        collect(future.result())
+        free_slots.put(slot)  # bufory klatki wracają do puli dopiero po odbiorze wyniku
+
+    # Dekodowanie w osobnym wątku (kolejka DECODE_QUEUE klatek), detekcja w puli wątków
+    # (OpenCV zwalnia GIL). Przesuwne okno DETECT_BATCH futures = back-pressure; odbiór
+    # w kolejności zgłoszeń – wątki nie czekają na najwolniejszą klatkę sztywnej paczki.
+    workers = os.cpu_count() or 1
+    max_inflight = max(DETECT_BATCH, workers)
+    inflight = deque()
+    coverage = np.zeros(_MASK_WORDS, dtype=np.uint64)
+    recent_gain = deque(maxlen=EARLY_EXIT_WINDOW)
+    saturated = False
+    # Pula slotów z buforami klatek: dekoder bierze wolny slot, a wraca on do puli dopiero
+    # po odebraniu wyniku detekcji – bufor nie zostanie nadpisany, póki klatka jest w użyciu.
+    free_slots = queue.Queue()
+    for _ in range(DECODE_QUEUE + max_inflight + 1):
+        free_slots.put({})
+    frame_q = queue.Queue(maxsize=DECODE_QUEUE)
+    stop = threading.Event()
+    decode_errors = []
+    decoder = threading.Thread(target=decode, name="decoder", daemon=True)
+    decoder_done = False
+    prev_cv_threads = cv2.getNumThreads()
+    if CV_THREADS is not None:
+        cv2.setNumThreads(CV_THREADS)
+    decoder.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not saturated:
+                item = frame_q.get()
+                if item is None:
+                    decoder_done = True
+                    break
+                if len(inflight) >= max_inflight:
+                    collect_next()
+                inflight.append((pool.submit(process_frame, *item), item[1]))
+            while inflight:
+                collect_next()
+    finally:
+        # Po wczesnym zakończeniu (lub błędzie detekcji) zatrzymaj dekoder i zwolnij sloty,
+        # na które może czekać – także te z nieodebranych futures
+        stop.set()
+        while inflight:
+            free_slots.put(inflight.popleft()[1])
+        while not decoder_done:
+            item = frame_q.get()
+            if item is None:
+                decoder_done = True
+            else:
+                free_slots.put(item[1])
+        decoder.join()
+        cap.release()
+        cv2.setNumThreads(prev_cv_threads)
+    if decode_errors:
+        raise decode_errors[0]
+
+    if saturated:
+        print(f"Pokrycie kadru nasycone po {processed_frames} klatkach – kończę wcześniej")
 
     if used_frames < 4:
         sys.exit("Za mało dobrych klatek z rogami ChArUco (>=4 wymagane).")
 
     print(f"Użyte klatki: {used_frames}")
+    charuco_corners_all, charuco_ids_all = select_views(charuco_corners_all, charuco_ids_all, image_size)
+    views = len(charuco_corners_all)
+    print(f"Ujęcia po odrzuceniu powtórzeń: {views}")
     print("Kalibracja…")
     retval, K, D, rvecs, tvecs, *_ = calibrate_charuco(charuco_corners_all, charuco_ids_all, board, image_size)
 
@@ -268,23 +561,24 @@ def calibrate_from_video(source_path: str):
              K=K, D=D, rvecs=rvecs, tvecs=tvecs, rms=retval,
              image_size=image_size, squares=(SQUARES_X, SQUARES_Y),
              square_mm=SQUARE_MM, marker_mm=MARKER_MM, dict=DICT_NAME,
-             frames_used=used_frames)
+             frames_used=used_frames, views_calibrated=views)
 
     meta = {
         "rms": float(retval),
-        "camera_matrix": K.tolist(),
-        "dist_coeffs": D.tolist(),
+        "camera_matrix": K,
+        "dist_coeffs": D,
         "image_size": image_size,
         "squares": [SQUARES_X, SQUARES_Y],
         "square_mm": SQUARE_MM,
         "marker_mm": MARKER_MM,
         "dict": DICT_NAME,
         "frames_used": used_frames,
+        "views_calibrated": views,
         "timestamp": stamp,
         "source": str(p)
     }
     with open(json_path, "w") as f:
-        json.dump(meta, f, indent=2)
+        json.dump(meta, f, indent=2, cls=NumpyEncoder)
 
     fs = cv2.FileStorage(str(xml_path), cv2.FILE_STORAGE_WRITE)
     fs.write("camera_matrix", K); fs.write("dist_coeffs", D); fs.release()
@@ -8,19 +8,22 @@ Generator ChArUco (A4, portret)
 – plansza wyśrodkowana, na dole czarna linia 100 mm do weryfikacji skali
 
 Uwaga: wymagany OpenCV z modułem aruco:
-    pip install opencv-contrib-python matplotlib
+    pip install opencv-contrib-python reportlab
 """
 
-from matplotlib import pyplot as plt
-from matplotlib.patches import Rectangle
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
 import numpy as np
 import cv2
+from PIL import Image
+import hashlib
+from functools import lru_cache
+from pathlib import Path
 
-MM_PER_INCH = 25.4
-
-# --- Strona A4 (portret) w mm oraz calach ---
+# --- Strona A4 (portret) w mm ---
 A4_W_MM, A4_H_MM = 210.0, 297.0
-A4_W_IN, A4_H_IN = A4_W_MM / MM_PER_INCH, A4_H_MM / MM_PER_INCH
 
 # --- Parametry ChArUco ---
 SQUARES_X = 4              # kolumny (liczba KWADRATÓW szachownicy)
@@ -44,80 +47,155 @@ SCALE_TICK_THICK_MM = 0.8
 SCALE_TICK_LEN_MM = 8.0
 SCALE_Y = 10.0  # 10 mm nad dolną krawędzią kartki
 
-# --- Przygotowanie słownika i planszy ChArUco ---
-aruco = cv2.aruco
-dictionary = aruco.getPredefinedDictionary(getattr(aruco, DICT_NAME))
-
-# Kompatybilność z różnymi wersjami OpenCV (4.5–4.10+)
-if hasattr(aruco, 'CharucoBoard_create'):
-    # starsze API
-    board = aruco.CharucoBoard_create(
-        squaresX=SQUARES_X,
-        squaresY=SQUARES_Y,
-        squareLength=SQUARE_MM,
-        markerLength=MARKER_MM,
-        dictionary=dictionary,
-    )
-else:
-    # nowsze API (cv2.aruco.CharucoBoard.create)
-    board = aruco.CharucoBoard.create(
-        SQUARES_X,
-        SQUARES_Y,
-        SQUARE_MM,
-        MARKER_MM,
-        dictionary,
-    )
-
-# Narysuj planszę w wysokiej rozdzielczości (raster), a następnie umieść ją w pliku PDF
-# z dokładnym pozycjonowaniem w milimetrach.
+# Plansza w PDF jako wektor: czarne pola i bity markerów to wypełnione prostokąty (ostre przy
+# każdej rozdzielczości druku). Gdy wymiary nie są wielokrotnością komórki bitu markera –
+# raster w wysokiej rozdzielczości z dokładnym pozycjonowaniem w milimetrach.
 PX_PER_MM = 12  # ~304.8 DPI na obszarze planszy (bardzo ostre krawędzie)
-board_w_px = int(round(BOARD_W_MM * PX_PER_MM))
-board_h_px = int(round(BOARD_H_MM * PX_PER_MM))
-# Rysowanie obrazu tablicy w zależności od API OpenCV
-if hasattr(board, 'generateImage'):
-    board_img = board.generateImage((board_w_px, board_h_px))
-else:
-    board_img = board.draw((board_w_px, board_h_px))
-
-# --- Kompozycja PDF w układzie milimetrów ---
-fig = plt.figure(figsize=(A4_W_IN, A4_H_IN))
-ax = fig.add_axes([0, 0, 1, 1])
-ax.set_axis_off()
-ax.set_xlim(0, A4_W_MM)
-ax.set_ylim(0, A4_H_MM)
-
-# tło
-ax.add_patch(Rectangle((0, 0), A4_W_MM, A4_H_MM, facecolor='white', edgecolor='none'))
-
-# umieść obraz planszy dokładnie w prostokącie [x0, x0+BOARD_W_MM] x [y0, y0+BOARD_H_MM]
-extent = [x0, x0 + BOARD_W_MM, y0, y0 + BOARD_H_MM]
-ax.imshow(board_img, cmap='gray', origin='lower', extent=extent, interpolation='nearest')
-
-# cienka ramka dookoła planszy (ułatwia cięcie/pozycjonowanie)
-ax.add_patch(Rectangle((x0, y0), BOARD_W_MM, BOARD_H_MM, fill=False, edgecolor='black', linewidth=0.4))
-
-# pasek 100 mm u dołu (wyśrodkowany horyzontalnie)
-scale_x0 = (A4_W_MM - SCALE_LEN_MM) / 2.0
-ax.add_patch(Rectangle((scale_x0, SCALE_Y), SCALE_LEN_MM, SCALE_BAR_THICK_MM,
-                       facecolor='black', edgecolor='black'))
-# kreski końcowe
-ax.add_patch(Rectangle((scale_x0, SCALE_Y - SCALE_TICK_LEN_MM/2),
-                       SCALE_TICK_THICK_MM, SCALE_TICK_LEN_MM,
-                       facecolor='black', edgecolor='black'))
-ax.add_patch(Rectangle((scale_x0 + SCALE_LEN_MM - SCALE_TICK_THICK_MM,
-                        SCALE_Y - SCALE_TICK_LEN_MM/2),
-                       SCALE_TICK_THICK_MM, SCALE_TICK_LEN_MM,
-                       facecolor='black', edgecolor='black'))
-# podpis skali
-ax.text(A4_W_MM/2.0, SCALE_Y + SCALE_BAR_THICK_MM + 2.5, '100 mm',
-        ha='center', va='bottom', fontsize=7)
-
-# (opcjonalnie) podpis techniczny poniżej planszy
-spec = f"ChArUco {SQUARES_X}×{SQUARES_Y} | square={SQUARE_MM:.0f} mm | marker={MARKER_MM:.0f} mm | {DICT_NAME} | A4"
-ax.text(A4_W_MM/2.0, y0 - 5.0, spec, ha='center', va='top', fontsize=7)
-
-# --- Zapis ---
-out_name = f"charuco_A4_{SQUARES_X}x{SQUARES_Y}_sq{int(SQUARE_MM)}mm_DICT6x6_1000.pdf"
-fig.savefig(out_name, format='pdf')
-plt.close(fig)
-print('Zapisano:', out_name)
\ No newline at end of file
+
+# Cache obrazu planszy – przy niezmienionych parametrach nie renderujemy jej ponownie
+CACHE_DIR = Path('.cache')
+
+
+@lru_cache(maxsize=1)
+def get_dictionary():
+    """Słownik DICT_NAME – tworzony raz na proces (wspólny dla wektora i rastra)."""
+    aruco = cv2.aruco
+    return aruco.getPredefinedDictionary(getattr(aruco, DICT_NAME))
+
+
+def make_board(dictionary):
+    """CharucoBoard kompatybilnie z różnymi wersjami OpenCV (4.5–4.10+)."""
+    aruco = cv2.aruco
+    if hasattr(aruco, 'CharucoBoard_create'):
+        # starsze API
+        return aruco.CharucoBoard_create(
+            squaresX=SQUARES_X,
+            squaresY=SQUARES_Y,
+            squareLength=SQUARE_MM,
+            markerLength=MARKER_MM,
+            dictionary=dictionary,
+        )
+    if hasattr(aruco.CharucoBoard, 'create'):
+        # przejściowe API (cv2.aruco.CharucoBoard.create)
+        return aruco.CharucoBoard.create(SQUARES_X, SQUARES_Y, SQUARE_MM, MARKER_MM, dictionary)
+    # OpenCV 4.7+: konstruktor z rozmiarem jako krotką (kolumny, wiersze)
+    return aruco.CharucoBoard((SQUARES_X, SQUARES_Y), SQUARE_MM, MARKER_MM, dictionary)
+
+
+def board_image() -> np.ndarray:
+    """Obraz planszy (uint8, 0/255) z cache na dysku (1-bitowy PNG); przy braku – render i zapis."""
+    board_w_px = int(round(BOARD_W_MM * PX_PER_MM))
+    board_h_px = int(round(BOARD_H_MM * PX_PER_MM))
+    cache_key = hashlib.sha1(
+        f"{SQUARES_X},{SQUARES_Y},{SQUARE_MM},{MARKER_MM},{DICT_NAME},{PX_PER_MM},{cv2.__version__}".encode()
+    ).hexdigest()[:12]
+    cache_path = CACHE_DIR / f"board_{cache_key}.png"
+
+    if cache_path.exists():
+        board_img = cv2.imread(str(cache_path), cv2.IMREAD_GRAYSCALE)
+        if board_img is not None and board_img.shape == (board_h_px, board_w_px):
+            return board_img  # w przeciwnym razie plik uszkodzony – render od nowa
+    # --- Przygotowanie słownika i planszy ChArUco ---
+    dictionary = get_dictionary()
+    board = make_board(dictionary)
+    # Rysowanie obrazu tablicy w zależności od API OpenCV
+    if hasattr(board, 'generateImage'):
+        board_img = board.generateImage((board_w_px, board_h_px))
+    else:
+        board_img = board.draw((board_w_px, board_h_px))
+    # Plansza jest czysto binarna (0/255) – PNG 1-bitowy: bezstratny, mniejszy i szybszy w zapisie
+    ok, png = cv2.imencode('.png', board_img, [cv2.IMWRITE_PNG_BILEVEL, 1])
+    if ok:
+        # przy nieudanym kodowaniu bez zapisu – uszkodzony plik nie trafi do cache
+        CACHE_DIR.mkdir(exist_ok=True)
+        cache_path.write_bytes(png.tobytes())
+    return board_img
+
+
+def board_cells():
+    """Plansza z 1 px na komórkę bitu markera (0/255) i bok komórki w mm.
+
+    None, gdy pole i margines markera nie są całkowitą wielokrotnością komórki.
+    """
+    dictionary = get_dictionary()
+    bits = getattr(dictionary, 'markerSize', None)
+    if not bits:
+        return None
+    cell_mm = MARKER_MM / (bits + 2)  # bity markera + ramka 1 bit z każdej strony
+    counts = (BOARD_W_MM / cell_mm, BOARD_H_MM / cell_mm, (SQUARE_MM - MARKER_MM) / 2 / cell_mm)
+    if any(abs(n - round(n)) > 1e-6 for n in counts):
+        return None
+    w, h = round(counts[0]), round(counts[1])
+    board = make_board(dictionary)
+    if hasattr(board, 'generateImage'):
+        return board.generateImage((w, h)), cell_mm
+    return board.draw((w, h)), cell_mm
+
+
+def draw_vector_board(c, cells, cell_mm):
+    """Czarne komórki jako prostokąty: seria w wierszu = jeden prostokąt, identyczne serie
+    w kolejnych wierszach scalane w pionie; całość jedną ścieżką bez obrysu."""
+    black = cells < 128
+    h = black.shape[0]
+    open_runs = {}  # (kolumna od, kolumna do) -> wiersz początkowy
+    path = c.beginPath()
+    for r in range(h + 1):
+        runs = set()
+        if r < h:
+            edges = np.flatnonzero(np.diff(np.concatenate(([False], black[r], [False])).view(np.int8)))
+            runs = set(zip(edges[::2].tolist(), edges[1::2].tolist()))
+        for run in [run for run in open_runs if run not in runs]:
+            r0 = open_runs.pop(run)
+            path.rect((x0 + run[0] * cell_mm) * mm, (y0 + BOARD_H_MM - r * cell_mm) * mm,
+                      (run[1] - run[0]) * cell_mm * mm, (r - r0) * cell_mm * mm)
+        for run in runs:
+            open_runs.setdefault(run, r)
+    c.setFillGray(0)
+    c.drawPath(path, stroke=0, fill=1)
+
+
+def main() -> str:
+    # --- Kompozycja PDF w układzie milimetrów (bezpośrednio w ReportLab) ---
+    # Układ współrzędnych PDF: początek w lewym dolnym rogu strony, jednostka = mm.
+    out_name = f"charuco_A4_{SQUARES_X}x{SQUARES_Y}_sq{int(SQUARE_MM)}mm_DICT6x6_1000.pdf"
+    c = canvas.Canvas(out_name, pagesize=(A4_W_MM * mm, A4_H_MM * mm))
+
+    # plansza dokładnie w prostokącie [x0, x0+BOARD_W_MM] x [y0, y0+BOARD_H_MM]
+    cells = board_cells()
+    if cells is not None:
+        draw_vector_board(c, *cells)
+    else:
+        # raster: obraz w skali szarości (PIL 'L') – w PDF jako DeviceGray, bez dekodowania PNG
+        c.drawImage(ImageReader(Image.fromarray(board_image())), x0 * mm, y0 * mm,
+                    width=BOARD_W_MM * mm, height=BOARD_H_MM * mm)
+
+    # cienka ramka dookoła planszy (ułatwia cięcie/pozycjonowanie)
+    c.setLineWidth(0.4)
+    c.rect(x0 * mm, y0 * mm, BOARD_W_MM * mm, BOARD_H_MM * mm, stroke=1, fill=0)
+
+    # pasek 100 mm u dołu (wyśrodkowany horyzontalnie) – wektorowe prostokąty bez obrysu
+    c.setFillGray(0)
+    scale_x0 = (A4_W_MM - SCALE_LEN_MM) / 2.0
+    c.rect(scale_x0 * mm, SCALE_Y * mm, SCALE_LEN_MM * mm, SCALE_BAR_THICK_MM * mm, stroke=0, fill=1)
+    # kreski końcowe
+    c.rect(scale_x0 * mm, (SCALE_Y - SCALE_TICK_LEN_MM/2) * mm,
+           SCALE_TICK_THICK_MM * mm, SCALE_TICK_LEN_MM * mm, stroke=0, fill=1)
+    c.rect((scale_x0 + SCALE_LEN_MM - SCALE_TICK_THICK_MM) * mm, (SCALE_Y - SCALE_TICK_LEN_MM/2) * mm,
+           SCALE_TICK_THICK_MM * mm, SCALE_TICK_LEN_MM * mm, stroke=0, fill=1)
+    # podpis skali
+    c.setFont('Helvetica', 7)
+    c.drawCentredString(A4_W_MM/2.0 * mm, (SCALE_Y + SCALE_BAR_THICK_MM + 2.5) * mm, '100 mm')
+
+    # (opcjonalnie) podpis techniczny poniżej planszy (górna krawędź tekstu 5 mm pod planszą)
+    spec = f"ChArUco {SQUARES_X}×{SQUARES_Y} | square={SQUARE_MM:.0f} mm | marker={MARKER_MM:.0f} mm | {DICT_NAME} | A4"
+    c.drawCentredString(A4_W_MM/2.0 * mm, (y0 - 5.0) * mm - pdfmetrics.getAscent('Helvetica', 7), spec)
+
+    # --- Zapis ---
+    c.showPage()
+    c.save()
+    print('Zapisano:', out_name)
+    return out_name
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Generuje wszystkie wzorce naraz – każdy generator w osobnym procesie.
+- generate_aruco_pattern.py -> patterns/charuco_4x6_40mm.jpg
+- generacja.py              -> charuco_A4_4x6_sq40mm_DICT6x6_1000.pdf
+
+Generatory są niezależne (osobne pliki wyjściowe), więc render planszy i kodowanie
+JPG/PNG/PDF idą równolegle na wielu rdzeniach.
+Wymaga: opencv-contrib-python, numpy, pillow, reportlab
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import generacja
+import generate_aruco_pattern
+
+GENERATORS = (
+    generate_aruco_pattern.generate_charuco_jpg,
+    generacja.main,
+)
+
+
+def run_one(fn) -> str:
+    return fn()
+
+
+def main():
+    workers = min(len(GENERATORS), os.cpu_count() or 1)
+    if workers == 1:
+        # Jeden rdzeń – bez narzutu uruchamiania procesów
+        outputs = [run_one(fn) for fn in GENERATORS]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            outputs = list(ex.map(run_one, GENERATORS))
+    print('Wygenerowano:', ', '.join(outputs))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,9 @@ Wymaga: opencv-contrib-python, pillow
 """
 
 import os
+import hashlib
+from io import BytesIO
+from functools import lru_cache
 import cv2
 import numpy as np
 from PIL import Image
@@ -38,34 +41,45 @@ SCALE_THICK_MM = 1.2
 TICK_THICK_MM  = 0.8
 TICK_LEN_MM    = 8.0
 LABEL_OFFSET_MM = 2.5
-
-def mm_to_px(mm: float, dpi: int) -> int:
-    return int(round(mm * dpi / MM_PER_INCH))
-
+LABEL_STROKE_MM = 0.17   # grubość kreski napisu "100 mm" (2 px przy 300 DPI)
+
+# --- Cache wyrenderowanej planszy (.npy) – przy tych samych parametrach bez ponownego renderu ---
+CACHE_DIR = '.cache'
+
+# --- Wykrycie API aruco raz, przy imporcie (różne wersje OpenCV) ---
+_ARUCO = getattr(cv2, 'aruco', None)
+if _ARUCO is None:
+    _GET_DICT = _MAKE_BOARD = None
+else:
+    # starsze API: Dictionary_get
+    _GET_DICT = getattr(_ARUCO, 'getPredefinedDictionary', None) or _ARUCO.Dictionary_get
+    if hasattr(_ARUCO, 'CharucoBoard_create'):
+        # starsze API (do 4.6)
+        _MAKE_BOARD = _ARUCO.CharucoBoard_create
+    else:
+        # nowy konstruktor (4.7+) – rozmiar jako krotka (kolumny, wiersze)
+        def _MAKE_BOARD(sx, sy, square_len, marker_len, dictionary):
+            return _ARUCO.CharucoBoard((sx, sy), square_len, marker_len, dictionary)
+# generateImage (4.x) lub draw (starsze API) – metoda klasy CharucoBoard
+_HAS_GENERATE_IMAGE = hasattr(getattr(_ARUCO, 'CharucoBoard', None), 'generateImage')
+
+def _require_aruco():
+    if _ARUCO is None:
+        raise RuntimeError("Brak modułu cv2.aruco – zainstaluj opencv-contrib-python.")
+
+@lru_cache(maxsize=8)
 def get_aruco_dictionary(name: str):
-    aruco = cv2.aruco
-    if hasattr(aruco, 'getPredefinedDictionary'):
-        return aruco.getPredefinedDictionary(getattr(aruco, name))
-    # starsze API
-    return aruco.Dictionary_get(getattr(aruco, name))
+    _require_aruco()
+    return _GET_DICT(getattr(_ARUCO, name))
 
 def create_charuco_board(sx: int, sy: int, square_mm: float, marker_mm: float, dictionary):
     """Tworzy obiekt CharucoBoard – kompatybilnie z różnymi wersjami OpenCV."""
-    aruco = cv2.aruco
+    _require_aruco()
     # Długości w jednostkach "świata" – tu po prostu w milimetrach (zgodne z mm).
-    square_len = float(square_mm)
-    marker_len = float(marker_mm)
-    board = None
-    # Preferowany nowy konstruktor (4.x)
     try:
-        board = aruco.CharucoBoard((sx, sy), square_len, marker_len, dictionary)
-    except Exception:
-        pass
-    # Fallback na starsze API (czasem obecne również w 4.x buildach)
-    if board is None and hasattr(aruco, 'CharucoBoard_create'):
-        board = aruco.CharucoBoard_create(sx, sy, square_len, marker_len, dictionary)
-    if board is None:
-        raise RuntimeError("Nie udało się utworzyć CharucoBoard – sprawdź instalację opencv-contrib-python.")
+        board = _MAKE_BOARD(sx, sy, float(square_mm), float(marker_mm), dictionary)
+    except Exception as e:
+        raise RuntimeError("Nie udało się utworzyć CharucoBoard – sprawdź instalację opencv-contrib-python.") from e
 
     # Opcjonalny układ legacy (zalecane dla zgodności z tutorialem 3.x / parzyste wymiary)
     if LEGACY_PATTERN and hasattr(board, 'setLegacyPattern'):
@@ -78,79 +92,153 @@ def create_charuco_board(sx: int, sy: int, square_mm: float, marker_mm: float, d
 def render_board_image(board, size_px: tuple[int, int]) -> np.ndarray:
     """Renderuje sam obraz planszy ChArUco jako GRAY."""
     w, h = size_px
-    # Preferowane: generateImage (4.x)
-    if hasattr(board, 'generateImage'):
+    if _HAS_GENERATE_IMAGE:
         # marginSize=0 (bez marginesu), borderBits=1 (obramowanie markerów)
         return board.generateImage((w, h), marginSize=0, borderBits=1)
     # Fallback: draw (starsze API)
-    if hasattr(board, 'draw'):
-        img = np.zeros((h, w), dtype=np.uint8)
-        board.draw((w, h), img, marginSize=0, borderBits=1)
-        return img
-    raise RuntimeError("Brak metod renderowania (generateImage/draw) dla CharucoBoard.")
-
-def generate_charuco_jpg(out_path: str = 'patterns/charuco_4x6_40mm.jpg') -> str:
-    # --- Płótno A4 (RGB, białe) ---
-    page_w_px  = mm_to_px(A4_W_MM, DPI)
-    page_h_px  = mm_to_px(A4_H_MM, DPI)
-    page = np.full((page_h_px, page_w_px, 3), 255, np.uint8)
-
-    # --- Słownik i board ---
-    aruco = cv2.aruco
-    dictionary = get_aruco_dictionary(DICT_NAME)
-    marker_mm = SQUARE_MM * MARKER_FRAC
-    board_w_mm = SQUARES_X * SQUARE_MM
-    board_h_mm = SQUARES_Y * SQUARE_MM
-    board_w_px = mm_to_px(board_w_mm, DPI)
-    board_h_px = mm_to_px(board_h_mm, DPI)
+    img = np.zeros((h, w), dtype=np.uint8)
+    board.draw((w, h), img, marginSize=0, borderBits=1)
+    return img
 
+def write_file(path: str, data) -> None:
+    """Zapis całego bufora do pliku: jedno write() (pętla tylko przy zapisie częściowym)."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+@lru_cache(maxsize=8)
+def label_glyph(label: str, font_scale: float, thickness: int):
+    """Napis wyrenderowany raz na białym tle: (glyph, (szer, wys) tekstu, margines w px).
+
+    Linia bazowa tekstu leży w wierszu pad + wys glifu, lewa krawędź w kolumnie pad.
+    """
+    (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
+    pad = thickness + 2  # grubość kreski i wygładzanie wychodzą poza prostokąt z getTextSize
+    glyph = np.full((th + baseline + 2 * pad, tw + 2 * pad), 255, np.uint8)
+    cv2.putText(glyph, label, (pad, pad + th), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, thickness,
+                lineType=cv2.LINE_AA)
+    glyph.setflags(write=False)
+    return glyph, (tw, th), pad
+
+@lru_cache(maxsize=4)
+def cached_board_image(board_w_px: int, board_h_px: int, marker_mm: float) -> np.ndarray:
+    """Obraz planszy z cache na dysku; przy braku – render i zapis do CACHE_DIR.
+
+    Wynik zapamiętany też w procesie (tylko do odczytu – wklejany do strony jako kopia).
+    """
+    key = hashlib.sha1(
+        f"{SQUARES_X},{SQUARES_Y},{SQUARE_MM},{marker_mm},{DICT_NAME},{LEGACY_PATTERN},"
+        f"{board_w_px},{board_h_px},{cv2.__version__}".encode()
+    ).hexdigest()[:12]
+    cache_path = os.path.join(CACHE_DIR, f'board_{key}.npy')
+    if os.path.exists(cache_path):
+        try:
+            board_gray = np.load(cache_path)
+            board_gray.setflags(write=False)
+            return board_gray
+        except (OSError, ValueError):
+            pass  # uszkodzony plik – wyrenderuj ponownie
+    dictionary = get_aruco_dictionary(DICT_NAME)
     board = create_charuco_board(SQUARES_X, SQUARES_Y, SQUARE_MM, marker_mm, dictionary)
     board_gray = render_board_image(board, (board_w_px, board_h_px))
-    board_bgr = cv2.cvtColor(board_gray, cv2.COLOR_GRAY2BGR)
-
-    # --- Pasek skali (w px) ---
-    scale_len_px = mm_to_px(SCALE_MM, DPI)
-    scale_th_px  = max(1, mm_to_px(SCALE_THICK_MM, DPI))
-    tick_th_px   = max(1, mm_to_px(TICK_THICK_MM,  DPI))
-    tick_len_px  = mm_to_px(TICK_LEN_MM, DPI)
-    gap_px       = mm_to_px(GAP_MM, DPI)
-    label_off_px = mm_to_px(LABEL_OFFSET_MM, DPI)
-
-    # Tekst pod paskiem
-    label = '100 mm'
-    font_scale = 0.8
-    thickness = max(1, int(round(2 * DPI / 300)))
-    text_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, thickness)
-
-    # Całkowita wysokość: plansza + przerwa + pasek + pół długości kresek + odstęp + napis
-    below_bar_extra = (tick_len_px // 2) + label_off_px + text_size[1]
-    content_h_px = board_h_px + gap_px + scale_th_px + below_bar_extra
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.save(cache_path, board_gray)
+    board_gray.setflags(write=False)
+    return board_gray
+
+@lru_cache(maxsize=8)
+def _scale_bar_px(dpi: int):
+    """Wymiary paska skali w px dla danego DPI oraz glif napisu "100 mm"."""
+    # Wszystkie wymiary naraz: jedno mnożenie i zaokrąglenie wektora mm -> px
+    mm_vals = np.array([SCALE_MM, SCALE_THICK_MM, TICK_THICK_MM, TICK_LEN_MM, LABEL_OFFSET_MM,
+                        LABEL_STROKE_MM])
+    (scale_len_px, scale_th_px, tick_th_px, tick_len_px, label_off_px,
+     stroke_px) = np.round(mm_vals * (dpi / MM_PER_INCH)).astype(int).tolist()
+    scale_th_px = max(1, scale_th_px)
+    tick_th_px  = max(1, tick_th_px)
+    font_scale = 0.8 * dpi / 300  # ta sama wielkość napisu w mm przy każdym DPI
+    thickness = max(1, stroke_px)
+    label = label_glyph('100 mm', font_scale, thickness)
+    return scale_len_px, scale_th_px, tick_th_px, tick_len_px, label_off_px, label
+
+def scale_bar_height_px(dpi: int) -> int:
+    """Wysokość od górnej krawędzi paska do dołu napisu (pasek + pół kreski + odstęp + napis)."""
+    _, scale_th_px, _, tick_len_px, label_off_px, (_, text_size, _) = _scale_bar_px(dpi)
+    return scale_th_px + (tick_len_px // 2) + label_off_px + text_size[1]
+
+def draw_scale_bar(page: np.ndarray, scale_y: int, dpi: int) -> None:
+    """Rysuje pasek 100 mm z kreskami końcowymi i podpisem, wyśrodkowany poziomo na stronie."""
+    scale_len_px, scale_th_px, tick_th_px, tick_len_px, label_off_px, label = _scale_bar_px(dpi)
+    glyph, text_size, pad = label
+    page_w_px = page.shape[1]
+    scale_x0 = (page_w_px - scale_len_px) // 2
+    # Prostokąty osiowe – zwykłe przypisanie wycinka; granice prawe/dolne wyłączne,
+    # więc pasek ma dokładnie scale_len_px (cv2.rectangle rysował o 1 px więcej)
+    tick_y0 = max(0, scale_y - tick_len_px // 2)
+    tick_y1 = scale_y + tick_len_px // 2
+    page[scale_y:scale_y + scale_th_px, scale_x0:scale_x0 + scale_len_px] = 0
+    # kreski końcowe
+    page[tick_y0:tick_y1, scale_x0:scale_x0 + tick_th_px] = 0
+    page[tick_y0:tick_y1, scale_x0 + scale_len_px - tick_th_px:scale_x0 + scale_len_px] = 0
+
+    # Podpis "100 mm"
+    tx = (page_w_px - text_size[0]) // 2
+    ty = scale_y + scale_th_px + label_off_px + text_size[1]
+    gy, gx = ty - text_size[1] - pad, tx - pad
+    region = page[gy:gy + glyph.shape[0], gx:gx + glyph.shape[1]]
+    np.minimum(region, glyph, out=region)  # czarny tekst na tle strony (bez putText przy każdym renderze)
+
+@lru_cache(maxsize=8)
+def page_layout(dpi: int):
+    """Układ strony dla danego DPI, liczony raz: rozmiar strony, planszy, jej lewy górny
+    róg (x0, y0) i górna krawędź paska skali."""
+    # Wymiary strony i planszy: jeden wektor mm -> px, zaokrąglony raz
+    page_w_px, page_h_px, board_w_px, board_h_px, gap_px = np.round(
+        np.array([A4_W_MM, A4_H_MM, SQUARES_X * SQUARE_MM, SQUARES_Y * SQUARE_MM, GAP_MM])
+        * (dpi / MM_PER_INCH)
+    ).astype(int).tolist()
+
+    # Całkowita wysokość: plansza + przerwa + pasek skali z kreskami i napisem
+    content_h_px = board_h_px + gap_px + scale_bar_height_px(dpi)
 
     # --- Pozycjonowanie na stronie ---
     x0 = (page_w_px  - board_w_px) // 2
     y0 = (page_h_px  - content_h_px) // 2
+    scale_y = y0 + board_h_px + gap_px
+    return (page_w_px, page_h_px), (board_w_px, board_h_px), (x0, y0), scale_y
 
-    # Wklej planszę
-    page[y0:y0 + board_h_px, x0:x0 + board_w_px] = board_bgr
+def render_a4_page(dpi: int = DPI) -> np.ndarray:
+    """Strona A4 (GRAY, uint8) z planszą i paskiem skali, wyrenderowana od razu w `dpi`."""
+    (page_w_px, page_h_px), (board_w_px, board_h_px), (x0, y0), scale_y = page_layout(dpi)
 
-    # Pasek skali (centrowany pod planszą)
-    scale_x0 = (page_w_px - scale_len_px) // 2
-    scale_y  = y0 + board_h_px + gap_px
-    cv2.rectangle(page, (scale_x0, scale_y), (scale_x0 + scale_len_px, scale_y + scale_th_px), (0, 0, 0), -1)
-    # kreski końcowe
-    cv2.rectangle(page, (scale_x0, scale_y - tick_len_px // 2),
-                  (scale_x0 + tick_th_px, scale_y + tick_len_px // 2), (0, 0, 0), -1)
-    cv2.rectangle(page, (scale_x0 + scale_len_px - tick_th_px, scale_y - tick_len_px // 2),
-                  (scale_x0 + scale_len_px, scale_y + tick_len_px // 2), (0, 0, 0), -1)
+    # --- Płótno A4 (skala szarości, białe) ---
+    page = np.full((page_h_px, page_w_px), 255, np.uint8)
 
-    # Podpis "100 mm"
-    tx = (page_w_px - text_size[0]) // 2
-    ty = scale_y + scale_th_px + label_off_px + text_size[1]
-    cv2.putText(page, label, (tx, ty), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness, lineType=cv2.LINE_AA)
+    # --- Board (z cache, jeśli parametry się nie zmieniły) ---
+    board_gray = cached_board_image(board_w_px, board_h_px, SQUARE_MM * MARKER_FRAC)
 
-    # Zapis JPG z DPI
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    Image.fromarray(page[..., ::-1]).save(out_path, format='JPEG', quality=95, dpi=(DPI, DPI))
+    # Wklej planszę
+    page[y0:y0 + board_h_px, x0:x0 + board_w_px] = board_gray
+
+    # Pasek skali (centrowany pod planszą)
+    draw_scale_bar(page, scale_y, dpi)
+    return page
+
+def generate_charuco_jpg(out_path: str = 'patterns/charuco_4x6_40mm.jpg', dpi: int = DPI) -> str:
+    """Renderuje planszę od razu w docelowej rozdzielczości `dpi` (bez skalowania obrazu)."""
+    page = render_a4_page(dpi)
+
+    # Zapis JPG z DPI: skala szarości (1 kanał zamiast 3), optymalizowane tablice Huffmana
+    # Kodowanie do pamięci i zapis jednym write() zamiast wielu małych zapisów enkodera
+    buf = BytesIO()
+    Image.fromarray(page, mode='L').save(buf, format='JPEG', quality=95, optimize=True,
+                                         dpi=(dpi, dpi))
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    write_file(out_path, buf.getbuffer())
     print(f'Zapisano: {out_path}')
     return out_path
 
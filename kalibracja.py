@@ -19,7 +19,7 @@ Wymaga: opencv-contrib-python (4.x), numpy.
 from __future__ import annotations
 import cv2
 import numpy as np
-import argparse, sys, os, glob, time
+import argparse, sys, os, glob, time, queue, threading
 from pathlib import Path
 from typing import List, Tuple
 
@@ -36,6 +36,14 @@ MIN_CORNERS = 12          # min. liczba rogów ChArUco, żeby zaakceptować klat
 MIN_FRAMES = 12           # min. liczba zaakceptowanych klatek do kalibracji
 FRAME_STEP = 1            # co którą klatkę analizować (1=każdą)
 MAX_FRAMES = 500          # górny limit analizowanych klatek/zdjęć
+VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi'}
+READ_QUEUE = 2            # klatki zdekodowane z wyprzedzeniem przez wątek czytający
+MIN_ENERGY = 0.0          # próg energii krawędzi (0 = bez wstępnego filtra klatek)
+ENERGY_SIZE = 128         # bok miniatury do pomiaru energii krawędzi [px]
+
+# ---------- Aruco3 (OpenCV 4.7+) ----------
+ARUCO3_MIN_SIDE = 32            # min. bok markera w pomniejszonym obrazie [px]
+ARUCO3_MIN_MARKER_RATIO = 0.05  # min. bok markera względem większego wymiaru obrazu
 
 # ---------- Flagi kalibracji ----------
 # RATIONAL_MODEL stabilizuje dystorsję, ZERO_TANGENT często ok;
@@ -54,7 +62,7 @@ def is_camera_index(s: str) -> bool:
     except ValueError:
         return False
 
-def create_detector_params():
+def create_detector_params(aruco3: bool = False):
     aruco = cv2.aruco
     # Zgodność z różnymi buildami
     params = getattr(aruco, 'DetectorParameters', None)
@@ -79,6 +87,12 @@ def create_detector_params():
     det.cornerRefinementWinSize = 5
     det.cornerRefinementMaxIterations = 50
     det.cornerRefinementMinAccuracy = 0.01
+    # Aruco3 (OpenCV 4.7+): wykrywanie na pomniejszonym obrazie, rogi doprecyzowane w pełnej rozdzielczości.
+    # Tylko na życzenie – pomija markery mniejsze niż ARUCO3_MIN_MARKER_RATIO wymiaru obrazu.
+    if aruco3 and hasattr(det, 'useAruco3Detection'):
+        det.useAruco3Detection = True
+        det.minSideLengthCanonicalImg = ARUCO3_MIN_SIDE
+        det.minMarkerLengthRatioOriginalImg = ARUCO3_MIN_MARKER_RATIO
     return det
 
 def create_charuco_params():
@@ -115,9 +129,9 @@ def create_board(sx: int, sy: int, square_mm: float, marker_mm: float, dictionar
             pass
     return board
 
-def make_charuco_detector(board):
+def make_charuco_detector(board, aruco3: bool = False):
     aruco = cv2.aruco
-    det_params = create_detector_params()
+    det_params = create_detector_params(aruco3)
     ch_params = create_charuco_params()
     CD = getattr(aruco, 'CharucoDetector', None)
     if CD is None:
@@ -135,22 +149,25 @@ def gather_images_from_source(source: str) -> List[str] | None:
         exts = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
         files = sorted([str(fp) for fp in p.iterdir() if fp.suffix.lower() in exts])
         return files
-    if p.exists() and p.is_file():
+    if p.exists() and p.is_file() and p.suffix.lower() not in VIDEO_EXTS:
         # pojedynczy obraz – potraktujemy jak listę 1-elementową
         return [str(p)]
     return None
 
+def edge_energy(gray) -> float:
+    """Odchylenie std. modułu gradientu Sobela na miniaturze – tani test, czy w kadrze są krawędzie."""
+    small = cv2.resize(gray, (ENERGY_SIZE, ENERGY_SIZE), interpolation=cv2.INTER_AREA)
+    gx = cv2.Sobel(small, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(small, cv2.CV_32F, 0, 1)
+    return float(cv2.meanStdDev(cv2.magnitude(gx, gy))[1][0, 0])
+
 def draw_debug(frame, charuco_corners, charuco_ids, marker_corners=None, marker_ids=None):
     vis = frame.copy()
     if marker_corners is not None and marker_ids is not None and len(marker_corners) > 0:
         cv2.aruco.drawDetectedMarkers(vis, marker_corners, marker_ids)
     if charuco_corners is not None and charuco_ids is not None and len(charuco_corners) > 0:
-        # rysuj numerki rogów
-        for i, (pt, idx) in enumerate(zip(charuco_corners, charuco_ids)):
-            c = tuple(int(v) for v in pt[0])
-            cv2.circle(vis, c, 3, (0, 255, 0), -1)
-            cv2.putText(vis, str(int(idx)), (c[0]+3, c[1]-3),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 200, 255), 1, cv2.LINE_AA)
+        # rogi z numerkami jednym wywołaniem (zamiast circle + putText dla każdego rogu)
+        cv2.aruco.drawDetectedCornersCharuco(vis, charuco_corners, charuco_ids, (0, 255, 0))
     return vis
 
 # ---------- Główna logika ----------
@@ -171,8 +188,19 @@ def main():
     ap.add_argument("--frame-step", type=int, default=FRAME_STEP, help="Co którą klatkę analizować.")
     ap.add_argument("--max-frames", type=int, default=MAX_FRAMES, help="Limit analizowanych klatek/zdjęć.")
     ap.add_argument("--show", action="store_true", help="Pokaż podgląd detekcji.")
+    ap.add_argument("--seek", action="store_true",
+                    help="Wideo: skocz do --max-frames klatek rozłożonych po nagraniu zamiast czytać kolejne.")
+    ap.add_argument("--aruco3", action="store_true",
+                    help="Szybsza detekcja Aruco3 (OpenCV 4.7+) dla dużych markerów w kadrze.")
+    ap.add_argument("--min-energy", type=float, default=MIN_ENERGY,
+                    help="Pomiń detekcję na klatkach o energii krawędzi poniżej progu (np. pusty stół); 0 = wył.")
+    ap.add_argument("--cv-threads", type=int, default=None,
+                    help="Liczba wątków OpenCV (cv2.setNumThreads); domyślnie bez zmian.")
     args = ap.parse_args()
 
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+
     # Normalizacja źródła: domyślnie kamera 0, rozwiń ewentualne '~'
     if args.source is None or str(args.source).strip() == "":
         args.source = "0"
@@ -197,7 +225,7 @@ def main():
     board = create_board(args.sx, args.sy, args.square_mm, marker_mm, dictionary)
 
     # Detector
-    charuco_detector, det_params, ch_params = make_charuco_detector(board)
+    charuco_detector, det_params, ch_params = make_charuco_detector(board, args.aruco3)
 
     # Zbieracze
     all_corners: List[np.ndarray] = []
@@ -208,12 +236,26 @@ def main():
     # Źródło: kamera/wideo czy obrazy?
     image_list = gather_images_from_source(args.source)
 
+    gray = None  # bufor szarości – wielokrotnie używany, dopóki rozmiar klatki się nie zmienia
+
     def process_frame(bgr) -> Tuple[int, np.ndarray | None]:
-        nonlocal accepted, imsize
+        nonlocal accepted, imsize, gray
         if imsize is None:
             h, w = bgr.shape[:2]
             imsize = (w, h)
-        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+            gray = np.empty((h, w), np.uint8)
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+
+        # Wstępny filtr: klatki bez krawędzi (plansza poza kadrem) pomijamy bez pełnej detekcji
+        if args.min_energy > 0:
+            energy = edge_energy(gray)
+            if energy < args.min_energy:
+                if not args.show:
+                    return 0, None
+                vis = bgr.copy()
+                cv2.putText(vis, f"SKIP [energy {energy:.1f} < {args.min_energy:g}]", (10, 24),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 210), 2, cv2.LINE_AA)
+                return 0, vis
 
         # Detekcja
         if charuco_detector is not None:
@@ -228,19 +270,24 @@ def main():
                     markerCorners, markerIds, gray, board)
 
         n_c = int(charucoCorners.shape[0]) if (charucoCorners is not None) else 0
-        vis = draw_debug(bgr, charucoCorners, charucoIds,
-                         markerCorners if 'markerCorners' in locals() else None,
-                         markerIds if 'markerIds' in locals() else None)
-
         if n_c >= args.min_corners:
-            all_corners.append(charucoCorners)
-            all_ids.append(charucoIds)
+            # ciągłe tablice o typach oczekiwanych przez OpenCV – bez kopii przy kalibracji
+            all_corners.append(np.ascontiguousarray(charucoCorners, dtype=np.float32))
+            all_ids.append(np.ascontiguousarray(charucoIds, dtype=np.int32))
             accepted += 1
             status = 1
+        else:
+            status = 0
+        if not args.show:
+            return status, None  # podgląd niepotrzebny – bez kopii klatki i rysowania
+
+        vis = draw_debug(bgr, charucoCorners, charucoIds,
+                         markerCorners if 'markerCorners' in locals() else None,
+                         markerIds if 'markerIds' in locals() else None)
+        if status:
             cv2.putText(vis, f"ACCEPT [{n_c} corners]", (10, 24),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 210, 0), 2, cv2.LINE_AA)
         else:
-            status = 0
             cv2.putText(vis, f"REJECT [{n_c} corners < {args.min_corners}]", (10, 24),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 210), 2, cv2.LINE_AA)
 
@@ -263,31 +310,100 @@ def main():
         if args.show:
             cv2.destroyAllWindows()
 
-    elif is_camera_index(args.source) or Path(args.source).suffix.lower() in {'.mp4', '.mov', '.mkv', '.avi'} or Path(args.source).exists():
+    elif is_camera_index(args.source) or Path(args.source).suffix.lower() in VIDEO_EXTS or Path(args.source).exists():
         # Tryb kamera/wideo
         cap = cv2.VideoCapture(0 if is_camera_index(args.source) else args.source)
         if not cap.isOpened():
             print(f"[ERROR] Nie otwarto źródła: {args.source}")
             sys.exit(1)
-        frame_idx = 0
+        if is_camera_index(args.source):
+            # bufor sterownika 1 klatka – zawsze świeża klatka zamiast zaległych (domyślnie ~4)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # Dekodowanie w osobnym wątku, detekcja i okno podglądu w głównym (wymóg imshow).
+        # Kamera: 1 miejsce i zawsze najnowsza klatka (bez zaległości); plik: odczyt z wyprzedzeniem.
+        live = is_camera_index(args.source)
+        frames_q: queue.Queue = queue.Queue(maxsize=1 if live else READ_QUEUE)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            if live:
+                while True:
+                    try:
+                        frames_q.put_nowait(item)
+                        return not stop.is_set()
+                    except queue.Full:
+                        try:
+                            frames_q.get_nowait()  # porzuć starszą, jeszcze nieprzetworzoną klatkę
+                        except queue.Empty:
+                            pass
+            while not stop.is_set():
+                try:
+                    frames_q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        # --seek (tylko pliki): max_frames klatek rozłożonych równomiernie po całym nagraniu
+        seek_idxs = None
+        if args.seek and not is_camera_index(args.source):
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if total > 0:
+                seek_idxs = np.unique(np.linspace(0, total - 1, args.max_frames, dtype=int)).tolist()
+            else:
+                print("[WARN] Nieznana liczba klatek – --seek pominięte.")
+
+        def seek_reader():
+            pos = 0
+            try:
+                for i in seek_idxs:
+                    if i != pos:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+                    ret, bgr = cap.read()
+                    if not ret or not put(bgr):
+                        break
+                    pos = i + 1
+            finally:
+                put(None)
+
+        def reader():
+            frame_idx = 0
+            read = 0
+            try:
+                # przy kamerze część klatek jest porzucana – limit max_frames liczy konsument
+                while (live or read < args.max_frames) and not stop.is_set():
+                    # pomijane klatki tylko grab() – bez retrieve() i konwersji do BGR
+                    if (frame_idx % args.frame_step) != 0:
+                        if not cap.grab():
+                            break
+                        frame_idx += 1
+                        continue
+                    ret, bgr = cap.read()
+                    if not ret or not put(bgr):
+                        break
+                    read += 1
+                    frame_idx += 1
+            finally:
+                put(None)  # koniec strumienia
+
+        reader_t = threading.Thread(target=reader if seek_idxs is None else seek_reader, daemon=True)
+        reader_t.start()
         used = 0
-        while True:
-            ret, bgr = cap.read()
-            if not ret:
-                break
-            if (frame_idx % args.frame_step) != 0:
-                frame_idx += 1
-                continue
-            status, vis = process_frame(bgr)
-            used += 1
-            if args.show:
-                cv2.imshow("ChArUco detect", vis)
-                if cv2.waitKey(1) & 0xFF == 27:
+        try:
+            while used < args.max_frames:
+                bgr = frames_q.get()
+                if bgr is None:
                     break
-            if used >= args.max_frames:
-                break
-            frame_idx += 1
-        cap.release()
+                status, vis = process_frame(bgr)
+                used += 1
+                if args.show:
+                    cv2.imshow("ChArUco detect", vis)
+                    if cv2.waitKey(1) & 0xFF == 27:
+                        break
+        finally:
+            stop.set()
+            reader_t.join()
+            cap.release()
         if args.show:
             cv2.destroyAllWindows()
     else:
@@ -318,7 +434,7 @@ def main():
     # Zapis wyników
     ts = time.strftime("%Y%m%d_%H%M%S")
     out_npz = Path(args.outdir) / f"charuco_calib_{ts}.npz"
-    np.savez_compressed(
+    np.savez(
         out_npz,
         K=K, D=D, rvecs=rvecs, tvecs=tvecs,
         stdIntrinsics=stdInt, stdExtrinsics=stdExt, perViewErrors=perViewErrors,
@@ -338,10 +454,8 @@ def main():
         # Stwórz syntetyczną kratkę dla podglądu (łatwiej zauważyć krzywizny)
         grid = np.full((h, w, 3), 255, np.uint8)
         step = max(40, min(w, h)//20)
-        for x in range(0, w, step):
-            cv2.line(grid, (x, 0), (x, h-1), (220, 220, 220), 1)
-        for y in range(0, h, step):
-            cv2.line(grid, (0, y), (w-1, y), (220, 220, 220), 1)
+        grid[:, ::step] = 220  # linie pionowe co step px
+        grid[::step, :] = 220  # linie poziome
         map1, map2 = cv2.initUndistortRectifyMap(K, D, None, newK, (w, h), cv2.CV_16SC2)
         und = cv2.remap(grid, map1, map2, interpolation=cv2.INTER_LINEAR)
         out_jpg = Path(args.outdir) / f"undistort_preview_{ts}.jpg"
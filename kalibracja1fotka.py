@@ -12,7 +12,10 @@ Domyślne:
 """
 
 from __future__ import annotations
-import sys, os, argparse, csv
+import sys, os, argparse, csv, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+from functools import partial
 from pathlib import Path
 import cv2
 import numpy as np
@@ -31,6 +34,28 @@ LEGACY_PATTERN = True
 DEF_MIN_CORNERS = 12
 DEF_MIN_AREA_FRAC = 0.08  # 8%
 
+# Aruco3: min. bok markera w obrazie kanonicznym [px] i min. bok markera względem obrazu
+ARUCO3_MIN_SIDE = 32
+ARUCO3_MIN_MARKER_RATIO = 0.05
+
+# Równoległość: obrazy są niezależne – po jednym procesie na rdzeń, paczki po kilka plików
+DEF_JOBS = os.cpu_count() or 1
+MAP_CHUNKSIZE = 8
+
+# Zapis overlay w tle: kodowanie JPEG nakłada się na detekcję kolejnego obrazu
+OVERLAY_WRITERS = 2
+OVERLAY_QUEUE = 4  # max. overlay czekających na zapis (każdy to pełna klatka w pamięci)
+OVERLAY_FLUSH_TIMEOUT = 60  # [s] oczekiwanie procesów puli na siebie przy domykaniu zapisów
+
+# Obiekty wykrywania – budowane raz na proces (w _init_worker), nie dla każdego obrazu
+_DICTIONARY = None
+_BOARD = None
+_DET_PARAMS = None
+_CHARUCO_DETECTOR = None  # None także przy starym API bez CharucoDetector
+_IO_POOL = None
+_IO_SLOTS = None
+_FLUSH_BARRIER = None  # bariera puli: każdy proces bierze dokładnie jedno zadanie _flush_worker
+
 def get_dictionary(name: str):
     aruco = cv2.aruco
     return aruco.getPredefinedDictionary(getattr(aruco, name)) if hasattr(aruco,'getPredefinedDictionary') \
@@ -56,7 +81,7 @@ def create_board(dict_):
             pass
     return board
 
-def make_detector_params():
+def make_detector_params(aruco3: bool = False):
     aruco = cv2.aruco
     DP = getattr(aruco, 'DetectorParameters', None)
     det = DP() if DP is not None and callable(DP) else aruco.DetectorParameters_create()
@@ -76,6 +101,12 @@ def make_detector_params():
     det.cornerRefinementWinSize = 5
     det.cornerRefinementMaxIterations = 50
     det.cornerRefinementMinAccuracy = 0.01
+    # Aruco3 (OpenCV 4.7+): wykrywanie na pomniejszonym obrazie, rogi doprecyzowane w pełnej rozdzielczości.
+    # Tylko na życzenie – pomija markery mniejsze niż ARUCO3_MIN_MARKER_RATIO wymiaru obrazu.
+    if aruco3 and hasattr(det, 'useAruco3Detection'):
+        det.useAruco3Detection = True
+        det.minSideLengthCanonicalImg = ARUCO3_MIN_SIDE
+        det.minMarkerLengthRatioOriginalImg = ARUCO3_MIN_MARKER_RATIO
     return det
 
 def list_images(root: Path, recursive: bool) -> list[str]:
@@ -86,20 +117,62 @@ def list_images(root: Path, recursive: bool) -> list[str]:
     files.sort()
     return files
 
-def eval_image(path: str, dictionary, board, det_params, outdir: Path,
-               min_corners: int, min_area_frac: float) -> tuple[bool,int,float,str]:
-    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
-    if bgr is None:
+def _init_worker(aruco3: bool = False, cv_threads: int | None = None, flush_barrier=None):
+    """Inicjalizacja procesu: słownik, plansza, parametry i detektor ChArUco w zmiennych modułu."""
+    global _DICTIONARY, _BOARD, _DET_PARAMS, _CHARUCO_DETECTOR, _IO_POOL, _IO_SLOTS, _FLUSH_BARRIER
+    if cv_threads is not None:
+        cv2.setNumThreads(cv_threads)
+    _DICTIONARY = get_dictionary(DICT_NAME)
+    _BOARD = create_board(_DICTIONARY)
+    _DET_PARAMS = make_detector_params(aruco3)
+    CD = getattr(cv2.aruco, 'CharucoDetector', None)
+    _CHARUCO_DETECTOR = CD(_BOARD, None, _DET_PARAMS) if CD is not None else None
+    _IO_POOL = ThreadPoolExecutor(max_workers=OVERLAY_WRITERS)
+    _IO_SLOTS = threading.BoundedSemaphore(OVERLAY_QUEUE)
+    _FLUSH_BARRIER = flush_barrier
+
+def _flush_overlays():
+    """Czeka na zapis wszystkich overlay zleconych w tym procesie."""
+    if _IO_POOL is not None:
+        _IO_POOL.shutdown(wait=True)
+
+def _flush_worker():
+    """Zadanie puli: domyka zapisy overlay tego procesu. Bariera przytrzymuje proces do czasu,
+    aż wszystkie wezmą swoje zadanie – żaden nie dostanie dwóch, żaden nie zostanie pominięty."""
+    _flush_overlays()
+    _FLUSH_BARRIER.wait(OVERLAY_FLUSH_TIMEOUT)
+
+def _overlay_written(out_img: str, future):
+    """Callback zapisu overlay: zwalnia miejsce w kolejce i zgłasza nieudany zapis."""
+    _IO_SLOTS.release()
+    try:
+        ok = future.result()
+    except Exception as e:
+        print(f"[WARN] Zapis overlay nie powiódł się: {out_img} ({e})")
+        return
+    if not ok:
+        print(f"[WARN] Zapis overlay nie powiódł się: {out_img}")
+
+def eval_image(path: str, min_corners: int, min_area_frac: float,
+               outdir_str: str, save_overlay: bool = True) -> tuple[bool,int,float,str]:
+    if _BOARD is None:
+        _init_worker()
+    dictionary, board, det_params, charuco_detector = _DICTIONARY, _BOARD, _DET_PARAMS, _CHARUCO_DETECTOR
+    outdir = Path(outdir_str)
+    # jedno dekodowanie na obraz: z overlay kolor + cvtColor, bez overlay od razu 1 kanał
+    if save_overlay:
+        bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY) if bgr is not None else None
+    else:
+        bgr, gray = None, cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
         print(f"[SKIP] Nie mogę odczytać: {path}")
         return False, 0, 0.0, ""
 
-    H, W = bgr.shape[:2]
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    H, W = gray.shape[:2]
     aruco = cv2.aruco
 
-    CD = getattr(aruco, 'CharucoDetector', None)
-    if CD is not None:
-        charuco_detector = CD(board, None, det_params)
+    if charuco_detector is not None:
         charucoCorners, charucoIds, markerCorners, markerIds = charuco_detector.detectBoard(gray)
     else:
         markerCorners, markerIds, _ = aruco.detectMarkers(gray, dictionary, parameters=det_params)
@@ -113,33 +186,35 @@ def eval_image(path: str, dictionary, board, det_params, outdir: Path,
     # udział pola BB rogów
     area_frac = 0.0
     if n > 0:
-        xs = charucoCorners[:,0,0]; ys = charucoCorners[:,0,1]
-        x0, x1 = float(np.min(xs)), float(np.max(xs))
-        y0, y1 = float(np.min(ys)), float(np.max(ys))
-        bw, bh = max(0.0, x1-x0), max(0.0, y1-y0)
-        area_frac = (bw*bh) / float(W*H)
+        pts = charucoCorners.reshape(-1, 2)
+        bw, bh = pts.max(axis=0).astype(np.float64) - pts.min(axis=0)  # różnica liczona w float64
+        area_frac = float(bw*bh) / float(W*H)
 
     ok = (n >= min_corners) and (area_frac >= min_area_frac)
 
-    # overlay
-    vis = bgr.copy()
+    verdict = 'ACCEPT' if ok else 'REJECT'
+    if not save_overlay:
+        print(f"[EVAL] {path}: corners={n} area={area_frac:.3f} -> {verdict}")
+        return ok, n, area_frac, ""
+
+    # overlay rysowany wprost na wczytanej klatce (nie jest już potrzebna)
+    vis = bgr
     if 'markerCorners' in locals() and markerCorners is not None and len(markerCorners) > 0:
         aruco.drawDetectedMarkers(vis, markerCorners, markerIds)
     if charucoCorners is not None and n > 0:
-        for pt in charucoCorners:
-            c = tuple(int(v) for v in pt[0])
-            cv2.circle(vis, c, 3, (0,255,0), -1)
+        aruco.drawDetectedCornersCharuco(vis, charucoCorners, None, (0,255,0))  # wszystkie rogi naraz
 
     color = (0,200,0) if ok else (0,0,230)
-    label = f"{'ACCEPT' if ok else 'REJECT'}  corners={n}  area={area_frac:.3f}"
+    label = f"{verdict}  corners={n}  area={area_frac:.3f}"
     cv2.putText(vis, label, (10,24), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2, cv2.LINE_AA)
     cv2.putText(vis, f"min_corners={min_corners}  min_area={min_area_frac:.3f}", (10,50),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (20,20,20), 2, cv2.LINE_AA)
 
     out_img = outdir / (Path(path).stem + "_charuco_debug.jpg")
-    cv2.imwrite(str(out_img), vis)
+    _IO_SLOTS.acquire()  # ogranicza liczbę klatek czekających w pamięci
+    _IO_POOL.submit(cv2.imwrite, str(out_img), vis).add_done_callback(partial(_overlay_written, str(out_img)))
 
-    print(f"[EVAL] {path}: corners={n} area={area_frac:.3f} -> {'ACCEPT' if ok else 'REJECT'}")
+    print(f"[EVAL] {path}: corners={n} area={area_frac:.3f} -> {verdict}")
     return ok, n, area_frac, str(out_img)
 
 def main():
@@ -150,6 +225,11 @@ def main():
     ap.add_argument("--min-corners", type=int, default=DEF_MIN_CORNERS, help="Minimalna liczba rogów.")
     ap.add_argument("--min-area-frac", type=float, default=DEF_MIN_AREA_FRAC, help="Minimalny udział BB rogów [0..1].")
     ap.add_argument("--csv", default=None, help="Opcjonalna ścieżka do CSV z wynikami.")
+    ap.add_argument("--save-overlays", action=argparse.BooleanOptionalAction, default=True,
+                    help="Zapis obrazów debug z naniesioną detekcją (--no-save-overlays = szybciej).")
+    ap.add_argument("--aruco3", action="store_true",
+                    help="Szybsza detekcja Aruco3 (OpenCV 4.7+) dla dużych markerów w kadrze.")
+    ap.add_argument("--jobs", type=int, default=DEF_JOBS, help="Liczba procesów (1 = bez puli).")
     args = ap.parse_args()
 
     root = Path(os.path.expanduser(args.dir))
@@ -158,11 +238,8 @@ def main():
         sys.exit(1)
 
     outdir = Path(args.outdir)
-    outdir.mkdir(parents=True, exist_ok=True)
-
-    dictionary = get_dictionary(DICT_NAME)
-    board = create_board(dictionary)
-    det_params = make_detector_params()
+    if args.save_overlays:
+        outdir.mkdir(parents=True, exist_ok=True)
 
     files = list_images(root, args.recursive)
     if not files:
@@ -170,26 +247,53 @@ def main():
         sys.exit(2)
 
     total, accepted = 0, 0
-    rows = []
 
-    for fp in files:
-        total += 1
-        ok, n, area, out_img = eval_image(fp, dictionary, board, det_params, outdir,
-                                          args.min_corners, args.min_area_frac)
-        if ok:
-            accepted += 1
-        rows.append([fp, ok, n, round(area, 6), out_img])
+    # CSV zapisywany na bieżąco – stała pamięć i częściowe wyniki nawet po przerwaniu
+    csv_path = Path(args.csv) if args.csv else None
+    csv_f = csv_path.open("w", newline="") if csv_path else None
+    w = csv.writer(csv_f) if csv_f else None
+    if w:
+        w.writerow(["file", "accepted", "corners", "area_frac", "debug_image"])
+
+    work = partial(eval_image, min_corners=args.min_corners,
+                   min_area_frac=args.min_area_frac, outdir_str=str(outdir),
+                   save_overlay=args.save_overlays)
+    jobs = max(1, min(args.jobs, len(files)))
+    if jobs == 1:
+        _init_worker(args.aruco3)
+        results = map(work, files)
+        pool = None
+    else:
+        # cv_threads=1: równoległość po stronie puli, nie wątków OpenCV
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                   initargs=(args.aruco3, 1, multiprocessing.Barrier(jobs)))
+        results = pool.map(work, files, chunksize=MAP_CHUNKSIZE)
+
+    try:
+        # wyniki w kolejności plików
+        for fp, (ok, n, area, out_img) in zip(files, results):
+            total += 1
+            if ok:
+                accepted += 1
+            if w:
+                w.writerow([fp, ok, n, round(area, 6), out_img])
+                csv_f.flush()
+        # zapisy overlay w tle: jawne domknięcie w każdym procesie (lub lokalnie bez puli)
+        if pool is not None:
+            for f in [pool.submit(_flush_worker) for _ in range(jobs)]:
+                f.result()
+        else:
+            _flush_overlays()
+    finally:
+        if csv_f:
+            csv_f.close()
+        if pool is not None:
+            pool.shutdown()
 
     print("\n========== SUMMARY ==========")
     print(f"Evaluated: {total}   ACCEPTED: {accepted}   REJECTED: {total-accepted}")
     print(f"Criteria : min_corners={args.min_corners}, min_area_frac={args.min_area_frac:.3f}")
-
-    if args.csv:
-        csv_path = Path(args.csv)
-        with csv_path.open("w", newline="") as f:
-            w = csv.writer(f)
-            w.writerow(["file", "accepted", "corners", "area_frac", "debug_image"])
-            w.writerows(rows)
+    if csv_path:
         print(f"[SAVE] CSV: {csv_path}")
 
 if __name__ == "__main__":